@@ -1,5 +1,5 @@
 import pandas as pd
-import json
+import orjson
 import os
 
 def csv_to_json():
@@ -11,12 +11,19 @@ def csv_to_json():
 
     df.columns = [col.strip() for col in df.columns]
     df.fillna("", inplace=True)
-    data = df.to_dict(orient="records")
+    # Build columns once and zip them into records; avoids the per-cell
+    # boxing done by df.to_dict(orient="records")
+    columns = {col: df[col].tolist() for col in df.columns}
+    data = [dict(zip(columns.keys(), row)) for row in zip(*columns.values())]
 
     json_root_path = os.path.join(root_dir, "scraped_data.json")
     json_local_path = os.path.join(script_dir, "scraped_data.json")
 
+    # Serialize once (orjson emits UTF-8 bytes directly) and write the same
+    # bytes to both locations
+    payload = orjson.dumps(data, option=orjson.OPT_INDENT_2)
+
     for path in [json_root_path, json_local_path]:
-        with open(path, "w", encoding="utf-8") as f:
-            json.dump(data, f, indent=2, ensure_ascii=False)
+        with open(path, "wb") as f:
+            f.write(payload)
         print(f"Saved JSON to {path}")
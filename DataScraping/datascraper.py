@@ -1,18 +1,68 @@
-import subprocess
 import os
+import functools
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pv
+import pyarrow.parquet as pq
 import traceback
-import google.generativeai as genai
 import re
 import numpy as np
+from DataScraping.llmcache import SemanticCache, cached_generate, evict, get_model, load_prompt, question_urls
+from DataScraping.runner import run_script
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 PROJECT_ROOT = os.path.abspath(os.path.join(BASE_DIR, ".."))
 
 CSV_PATH = os.path.join(PROJECT_ROOT, "scraped_data.csv")
+TASK_PROMPT_PATH = os.path.join(BASE_DIR, "task_breakdown.txt")
+FEEDBACK_PROMPT_PATH = os.path.join(BASE_DIR, "feedback_scraper.txt")
+SCRAPER_PATH = os.path.join(BASE_DIR, "generated_scraper.py")
+
+# Scraper candidates generated and run concurrently per attempt; the first valid one wins
+CANDIDATES_PER_ATTEMPT = 3
+
+# Scrapers that produced a valid CSV, looked up by question similarity and stored
+# with the question's URLs. Above REUSE the cached scraper is run without asking
+# Gemini, but only if the new question names exactly the same URLs (the scraper
+# hard-codes them); otherwise, and above SEED, it is offered to Gemini as a starting point.
+SCRAPER_CACHE = SemanticCache("scrapers")
+SCRAPER_REUSE_SIMILARITY = 0.92
+SCRAPER_SEED_SIMILARITY = 0.7
+
+# Patterns used on every attempt, compiled once
+_HARDCODED_PATTERNS = [
+    re.compile(p, re.IGNORECASE) for p in [
+        r"dropna\(subset=\[.*?'(Gross|Year|Rank|Title)'.*?\]",
+        r"df\['(Gross|Year|Rank|Title)'\]",
+        r"subset=\[.*?'(Gross|Year|Rank|Title)'.*?\]",
+        r"\.drop\(.*?'(Gross|Year|Rank|Title)'.*?\)"
+    ]
+]
+_DF_LEN_RE = re.compile(r"len\(.*?(?:columns|headers).*?\)")
+_CODE_BLOCK_RE = re.compile(r"```(?:python)?\n(.*?)```", re.DOTALL)
+_DIGITS_RE = re.compile(r"^\d+$")
+_NUM_STRIP_RE = re.compile(r"[^\d\.\-]")
+
+# Bytes per block when postprocess_csv streams the scraped CSV through Arrow, and
+# rows per batch when it streams the scraper's Parquet copy instead
+POSTPROCESS_BLOCK_BYTES = 8 << 20
+POSTPROCESS_BATCH_ROWS = 100_000
+# Column-name keywords marking a column as text (never coerced to numbers) or as a date candidate
+TEXT_COLUMN_KEYWORDS = ['title', 'name', 'film', 'movie', 'director', 'actor', 'description']
+DATE_COLUMN_KEYWORDS = ['date', 'release', 'premiere', 'published']
+
+# Rows parsed by is_csv_valid for header/dtype checks; the row count comes from a byte scan
+VALIDATION_SAMPLE_ROWS = 100
 
 import os
 
+@functools.lru_cache(maxsize=None)
+def _question_file_pattern(prefix):
+    return re.compile(rf"{re.escape(prefix)}(\d+)\.txt$")
+
 def save_uploaded_question(uploaded_file, scraped_json_path="scraped_data.json", prefix="question"):
     """
     Save the uploaded question file into the same directory where scraped_data.json is located.
@@ -24,24 +74,15 @@ def save_uploaded_question(uploaded_file, scraped_json_path="scraped_data.json",
     
     os.makedirs(folder, exist_ok=True)
 
-    existing = [
-        f for f in os.listdir(folder)
-        if f.startswith(prefix) and f.endswith(".txt")
-    ]
-    numbers = []
-    for f in existing:
-        try:
-            num = int(f[len(prefix):-4])
-            numbers.append(num)
-        except ValueError:
-            continue
-
-    next_num = max(numbers) + 1 if numbers else 1
+    pattern = _question_file_pattern(prefix)
+    with os.scandir(folder) as entries:
+        next_num = max((int(m.group(1)) for entry in entries if (m := pattern.match(entry.name))), default=0) + 1
     filename = f"{prefix}{next_num}.txt"
     filepath = os.path.join(folder, filename)
 
+    # Stream the upload to disk instead of buffering it all in memory
     with open(filepath, "wb") as f:
-        f.write(uploaded_file.file.read())
+        shutil.copyfileobj(uploaded_file.file, f, length=1 << 20)
 
     print(f"[save_uploaded_question] Saved: {filepath}")
     return filepath
@@ -60,15 +101,8 @@ def debug_generated_code(scraper_path):
         warnings = []
         
         # Check for hardcoded column assumptions
-        hardcoded_patterns = [
-            r"dropna\(subset=\[.*?'(Gross|Year|Rank|Title)'.*?\]",
-            r"df\['(Gross|Year|Rank|Title)'\]",
-            r"subset=\[.*?'(Gross|Year|Rank|Title)'.*?\]",
-            r"\.drop\(.*?'(Gross|Year|Rank|Title)'.*?\)"
-        ]
-        
-        for pattern in hardcoded_patterns:
-            matches = re.findall(pattern, code, re.IGNORECASE)
+        for pattern in _HARDCODED_PATTERNS:
+            matches = pattern.findall(code)
             if matches:
                 issues.append(f"Found hardcoded column assumptions: {set(matches)}")
         
@@ -92,7 +126,7 @@ def debug_generated_code(scraper_path):
         
         # Check for DataFrame creation issues
         if 'pd.DataFrame(' in code and 'columns=' in code:
-            if not re.search(r'len\(.*?columns.*?\)', code) and not re.search(r'len\(.*?headers.*?\)', code):
+            if not _DF_LEN_RE.search(code):
                 issues.append("DataFrame creation without length validation may cause column mismatch")
         
         # Check for proper table parsing
@@ -134,8 +168,27 @@ def debug_generated_code(scraper_path):
     except Exception as e:
         print(f"[debug] Error analyzing code: {e}")
 
-def analyze_csv_structure(csv_path=CSV_PATH):
-    """Analyze the structure of the generated CSV to identify issues"""
+def _count_csv_rows(csv_path):
+    """Count data rows (records after the header). A byte scan for newlines is enough
+    while the file has no quote characters; otherwise a quoted cell may span lines,
+    so the records are counted by Arrow's CSV parser instead."""
+    lines = 0
+    last = b"\n"
+    quoted = False
+    with open(csv_path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            lines += block.count(b"\n")
+            quoted = quoted or b'"' in block
+            last = block[-1:]
+    if quoted:
+        return sum(batch.num_rows for batch in _open_csv_reader(csv_path))
+    if last != b"\n":
+        lines += 1
+    return max(lines - 1, 0)
+
+def analyze_csv_structure(csv_path=CSV_PATH, df=None, n_rows=None):
+    """Analyze the structure of the generated CSV to identify issues.
+    Callers that already read the header/first rows or counted the rows can pass them as df/n_rows."""
     print("[analyze] Analyzing CSV structure...")
     
     if not os.path.exists(csv_path):
@@ -145,13 +198,16 @@ def analyze_csv_structure(csv_path=CSV_PATH):
     try:
         # Read raw file content first
         with open(csv_path, 'r', encoding='utf-8') as f:
-            raw_content = f.read()[:1000]  # First 1000 chars
+            raw_content = f.read(1000)  # First 1000 chars
         
         print(f"[analyze] Raw CSV content preview:\n{raw_content}")
         
-        # Try to read as CSV
-        df = pd.read_csv(csv_path)
-        print(f"[analyze] CSV shape: {df.shape}")
+        # Only the header and first row are inspected, so don't parse the rest
+        if df is None:
+            df = pd.read_csv(csv_path, nrows=1)
+        if n_rows is None:
+            n_rows = _count_csv_rows(csv_path)
+        print(f"[analyze] CSV shape: ({n_rows}, {df.shape[1]})")
         print(f"[analyze] Columns: {list(df.columns)}")
         
         # Check for common structural issues
@@ -184,92 +240,252 @@ def analyze_csv_structure(csv_path=CSV_PATH):
     except Exception as e:
         print(f"[analyze] Error analyzing CSV: {e}")
 
+def _parquet_sibling(csv_path):
+    """
+    Path of the typed Parquet copy the scraper writes next to its CSV, if there is
+    one that is at least as new as the CSV and has the same columns; else None.
+    """
+    parquet_path = os.path.splitext(csv_path)[0] + ".parquet"
+    if not os.path.exists(parquet_path) or os.path.getmtime(parquet_path) < os.path.getmtime(csv_path):
+        return None
+    try:
+        parquet_columns = pq.read_schema(parquet_path).names
+        csv_columns = pd.read_csv(csv_path, nrows=0).columns.tolist()
+    except Exception as e:
+        print(f"[postprocess_csv] Ignoring unreadable Parquet file {parquet_path}: {e}")
+        return None
+    return parquet_path if parquet_columns == csv_columns else None
+
+def _unique_column_names(names):
+    """Strip column names and number repeats the way pd.read_csv does (x, x.1, x.2, ...)."""
+    unique = []
+    for name in (str(name).strip() for name in names):
+        candidate, n = name, 0
+        while candidate in unique:
+            n += 1
+            candidate = f"{name}.{n}"
+        unique.append(candidate)
+    return unique
+
+def _open_csv_reader(csv_path):
+    """
+    Arrow streaming reader over the CSV with every column read as string, under
+    the stripped, de-duplicated header names (see _unique_column_names).
+    """
+    # Quoted cells may span lines (to_csv writes wrapped cells that way), as pd.read_csv allows
+    parse_options = pv.ParseOptions(newlines_in_values=True)
+    header = pv.open_csv(csv_path, read_options=pv.ReadOptions(block_size=POSTPROCESS_BLOCK_BYTES),
+                         parse_options=parse_options).schema.names
+    names = _unique_column_names(header)
+    read_options = pv.ReadOptions(block_size=POSTPROCESS_BLOCK_BYTES, column_names=names, skip_rows=1)
+    convert_options = pv.ConvertOptions(
+        column_types={name: pa.string() for name in names},
+        strings_can_be_null=True,
+    )
+    return pv.open_csv(csv_path, read_options=read_options, parse_options=parse_options,
+                       convert_options=convert_options)
+
+def _as_csv_text(frame):
+    """
+    Render typed columns as the strings df.to_csv writes for them (True/False, dates
+    without a midnight time), keeping nulls, so a Parquet chunk is profiled and cleaned
+    exactly like the same rows read from the CSV. Arrow's own string cast differs
+    (true/false, 2009-12-18 00:00:00.000000).
+    """
+    text = frame.astype(str)
+    for col in frame.columns[frame.dtypes.map(pd.api.types.is_datetime64_any_dtype)]:
+        values = frame[col].dropna()
+        if (values == values.dt.normalize()).all():
+            text[col] = frame[col].dt.strftime('%Y-%m-%d')
+    return text.where(frame.notna(), None)
+
+def _read_csv_chunks(csv_path):
+    """
+    Stream the scraped table one DataFrame per block. The scraper's Parquet copy is
+    preferred when present (columnar, no CSV tokenizing or quoting ambiguity);
+    otherwise the CSV goes through Arrow's multithreaded parser. Every column comes
+    out as string so types stay consistent from one block to the next; numeric and
+    date inference is done over the whole file by _profile_csv. Column names are
+    stripped and unique, so chunk[col] is always a single column.
+    """
+    parquet_path = _parquet_sibling(csv_path)
+    if parquet_path:
+        for batch in pq.ParquetFile(parquet_path).iter_batches(batch_size=POSTPROCESS_BATCH_ROWS):
+            names = _unique_column_names(batch.schema.names)
+            yield _as_csv_text(pa.RecordBatch.from_arrays(batch.columns, names=names).to_pandas())
+        return
+
+    for batch in _open_csv_reader(csv_path):
+        yield batch.to_pandas()
+
+def _is_text_column_name(col):
+    return any(keyword in col.lower() for keyword in TEXT_COLUMN_KEYWORDS)
+
+def _coerce_numeric(block):
+    """Drop everything but digits, '.' and '-' from each column of `block` and parse the rest as numbers."""
+    return block.apply(lambda s: pd.to_numeric(s.str.replace(_NUM_STRIP_RE, '', regex=True), errors='coerce'))
+
+def _profile_csv(csv_path):
+    """
+    First pass of postprocess_csv: gather per-column statistics over every chunk
+    (emptiness, numeric and date convertibility) so conversions are decided for the
+    whole file without holding it in memory.
+    """
+    stats = {}
+    n_rows = 0
+    for chunk in _read_csv_chunks(csv_path):
+        n_rows += len(chunk)
+
+        # Numeric coercion for every candidate column in one call; columns with
+        # text-like names are never converted, so they aren't counted
+        candidates = [col for col in chunk.columns if not _is_text_column_name(col)]
+        numeric_counts = _coerce_numeric(chunk[candidates]).notna().sum()
+        # A column is worth keeping if any cell is both non-null and non-blank
+        has_value = (chunk.notna() & chunk.ne('')).any(axis=0)
+
+        for col in chunk.columns:
+            values = chunk[col]
+            col_stats = stats.setdefault(col, {
+                "has_value": False,
+                "native_numeric": True,
+                "numeric_count": 0,
+                "date_count": 0,
+                "digits_only": True,
+            })
+            col_stats["has_value"] |= bool(has_value[col])
+
+            stripped = values.str.strip()
+            if col_stats["native_numeric"]:
+                present = stripped.dropna()
+                col_stats["native_numeric"] = bool(pd.to_numeric(present, errors='coerce').notna().all())
+
+            col_stats["numeric_count"] += int(numeric_counts.get(col, 0))
+
+            if any(keyword in col.lower() for keyword in DATE_COLUMN_KEYWORDS):
+                try:
+                    parsed_dates = pd.to_datetime(stripped, errors='coerce')
+                    col_stats["date_count"] += int(parsed_dates.notna().sum())
+                    col_stats["digits_only"] &= bool(stripped.str.match(_DIGITS_RE, na=False).all())
+                except Exception as e:
+                    print(f"[postprocess_csv] Date parsing skipped for column '{col}': {e}")
+
+    return n_rows, stats
+
+def _plan_postprocess(n_rows, stats):
+    """Decide, from the profile, which columns to keep and how each one is converted."""
+    plan = {"keep": [], "numeric": [], "to_numeric": [], "dates": [], "text": []}
+    if n_rows == 0:
+        return plan
+
+    for col, col_stats in stats.items():
+        # Remove completely empty columns
+        if not col_stats["has_value"]:
+            continue
+        plan["keep"].append(col)
+
+        if col_stats["native_numeric"]:
+            plan["numeric"].append(col)
+            continue
+
+        # Skip if column name suggests it should be text (title, name, etc.); otherwise
+        # only convert if more than 70% of values are numeric
+        if not _is_text_column_name(col) and col_stats["numeric_count"] / n_rows > 0.7:
+            plan["to_numeric"].append(col)
+            continue
+
+        # Date parsing - only on date-like column names, when most values are valid dates
+        # AND they look like real dates (not just numbers)
+        is_date_name = any(keyword in col.lower() for keyword in DATE_COLUMN_KEYWORDS)
+        if is_date_name and col_stats["date_count"] / n_rows > 0.8 and not col_stats["digits_only"]:
+            plan["dates"].append(col)
+            continue
+
+        plan["text"].append(col)
+
+    return plan
+
+def _clean_chunk(chunk, plan):
+    """Second pass of postprocess_csv: apply the planned cleaning to one chunk."""
+    chunk = chunk[plan["keep"]].copy()
+
+    # The plan already partitions the columns, so each step is one assignment over
+    # its block instead of a per-column loop with dtype checks
+    string_cols = plan["dates"] + plan["text"]
+    if string_cols:
+        chunk[string_cols] = chunk[string_cols].apply(lambda s: s.str.strip())
+
+    if plan["to_numeric"]:
+        # float64 in every chunk, so the written format doesn't depend on where NaNs fall
+        chunk[plan["to_numeric"]] = _coerce_numeric(chunk[plan["to_numeric"]]).astype('float64')
+
+    if plan["dates"]:
+        chunk[plan["dates"]] = chunk[plan["dates"]].apply(pd.to_datetime, errors='coerce')
+
+    if plan["text"]:
+        chunk[plan["text"]] = chunk[plan["text"]].fillna("")
+
+    # Drop empty rows with a single mask: text columns are filled with "" above, so
+    # when there are any, a row is kept only if one of them is non-blank
+    if plan["text"]:
+        keep_rows = chunk[plan["text"]].ne('').any(axis=1)
+    else:
+        keep_rows = chunk.notna().any(axis=1)
+
+    return chunk[keep_rows]
+
 def postprocess_csv(csv_path=CSV_PATH):
     print(f"[postprocess_csv] Checking CSV at: {csv_path}")
     if not os.path.exists(csv_path):
         print(f"[postprocess_csv] CSV file not found at {csv_path}")
         return False
 
+    tmp_path = f"{csv_path}.tmp"
     try:
+        # Read the header/first row and count rows once, shared with analyze_csv_structure
+        head = pd.read_csv(csv_path, nrows=1)
+        n_rows = _count_csv_rows(csv_path)
+
         # First, analyze the problematic structure
-        analyze_csv_structure(csv_path)
+        analyze_csv_structure(csv_path, df=head, n_rows=n_rows)
         
-        df = pd.read_csv(csv_path)
-        print(f"[postprocess_csv] CSV loaded, shape: {df.shape}")
+        columns = head.columns
+        print(f"[postprocess_csv] CSV header loaded, shape: ({n_rows}, {len(columns)})")
 
         # Check for severely malformed data (like your example)
-        if df.shape[1] <= 2 and df.shape[0] <= 10:
+        if len(columns) <= 2 and n_rows <= 10:
             # Check if columns contain concatenated data
-            for col in df.columns:
+            for col in columns:
                 col_str = str(col)
                 if len(col_str) > 50 or any(pattern in col_str.lower() for pattern in ['rank', 'year', 'title', 'gross']):
                     print(f"[postprocess_csv] WARNING: Malformed column detected: {col_str[:100]}...")
                     print("[postprocess_csv] This suggests the scraper concatenated headers instead of parsing table structure")
                     return False
 
-        # Remove completely empty columns and rows
-        df = df.dropna(axis=1, how='all')
-        df = df.loc[:, (df != '').any(axis=0)]
-        df.columns = df.columns.str.strip()
-
-        # Clean string columns
-        for col in df.select_dtypes(include=["object"]).columns:
-            df[col] = df[col].astype(str).str.strip()
-
-        # Convert numeric columns more carefully
-        for col in df.columns:
-            if pd.api.types.is_numeric_dtype(df[col]):
-                continue
-            
-            # Skip if column name suggests it should be text (title, name, etc.)
-            if any(keyword in col.lower() for keyword in ['title', 'name', 'film', 'movie', 'director', 'actor', 'description']):
-                continue
-                
-            # Try to convert to numeric, but be more conservative
-            cleaned_values = df[col].astype(str).str.replace(r'[^\d\.\-]', '', regex=True)
-            converted = pd.to_numeric(cleaned_values, errors='coerce')
-            
-            # Only convert if more than 70% of values are numeric and it's not already text-heavy
-            if converted.notna().sum() / len(df) > 0.7:
-                df[col] = converted
-
-        # Date parsing - be much more selective
-        for col in df.columns:
-            # Only try date parsing on columns that likely contain dates
-            if any(keyword in col.lower() for keyword in ['date', 'release', 'premiere', 'published']):
-                try:
-                    parsed_dates = pd.to_datetime(df[col], errors='coerce', infer_datetime_format=True)
-                    # Only convert if most values are valid dates AND they look like real dates (not just numbers)
-                    if (parsed_dates.notna().sum() / len(df) > 0.8 and 
-                        not df[col].astype(str).str.match(r'^\d+$').all()):  # Not just plain numbers
-                        df[col] = parsed_dates
-                except Exception as e:
-                    print(f"[postprocess_csv] Date parsing skipped for column '{col}': {e}")
-
-        for col in df.columns:
-            if pd.api.types.is_numeric_dtype(df[col]):
-                pass
-            else:
-                df[col] = df[col].fillna("")
+        # Stream the file twice: once to decide conversions for whole columns, once to
+        # apply them chunk by chunk, so memory stays bounded by the chunk size
+        n_rows, stats = _profile_csv(csv_path)
+        plan = _plan_postprocess(n_rows, stats)
+        print(f"[postprocess_csv] Keeping {len(plan['keep'])} columns; "
+              f"numeric: {plan['to_numeric']}, dates: {plan['dates']}")
 
-        df = df.dropna(how='all')
-        
-        text_cols = df.select_dtypes(include=['object']).columns
-        if len(text_cols) > 0:
-            df = df[df[text_cols].apply(lambda x: x.astype(str).str.strip().ne('').any(), axis=1)]
+        with open(tmp_path, "w", encoding="utf-8", newline="") as out:
+            pd.DataFrame(columns=plan["keep"]).to_csv(out, index=False)
+            for chunk in _read_csv_chunks(csv_path):
+                _clean_chunk(chunk, plan).to_csv(out, index=False, header=False)
 
-        df.to_csv(csv_path, index=False, encoding='utf-8')
+        os.replace(tmp_path, csv_path)
         print(f"[postprocess_csv] CSV postprocessing complete and saved")
         return True
         
     except Exception as e:
         print(f"[postprocess_csv] Exception in postprocess_csv: {e}")
         traceback.print_exc()
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
         return False
 
-def is_csv_valid():
+def is_csv_valid(csv_path=CSV_PATH, df=None, n_rows=None):
     errors = []
-    csv_path = CSV_PATH
     print(f"[is_csv_valid] Validating CSV at: {csv_path}")
     try:
         if not os.path.exists(csv_path):
@@ -277,10 +493,14 @@ def is_csv_valid():
             print("[is_csv_valid] CSV file not found")
             return False, errors
         
-        df = pd.read_csv(csv_path)
-        print(f"[is_csv_valid] CSV loaded, shape: {df.shape}")
-
-        if df.empty or df.shape[0] < 5:
+        # df/n_rows may be passed in by task_breakdown, which reuses them for its preview
+        if n_rows is None:
+            n_rows = _count_csv_rows(csv_path)
+        if df is None:
+            df = pd.read_csv(csv_path, nrows=VALIDATION_SAMPLE_ROWS)
+        print(f"[is_csv_valid] CSV loaded, rows: {n_rows}, sample shape: {df.shape}")
+
+        if df.empty or n_rows < 5:
             errors.append("CSV has fewer than 5 rows or is empty")
             print("[is_csv_valid] CSV too small or empty")
 
@@ -295,19 +515,19 @@ def is_csv_valid():
                 errors.append(f"Column name too long, suggests malformed parsing: {col_str[:50]}...")
                 print(f"[is_csv_valid] Long column name detected: {col_str[:50]}...")
 
-        text_cols = [c for c in df.columns if df[c].dtype == object]
+        # Partition columns by dtype once
+        dtypes = df.dtypes
+        text_cols = dtypes.index[dtypes == object].tolist()
+        numeric_cols = dtypes.index[dtypes.map(pd.api.types.is_numeric_dtype)].tolist()
+
         if not text_cols:
             errors.append("No text columns found")
             print("[is_csv_valid] No text columns found")
         else:
             try:
-                all_text_empty = True
-                for col in text_cols:
-                    non_empty_count = df[col].astype(str).str.strip().replace('', None).dropna().shape[0]
-                    if non_empty_count > 0:
-                        all_text_empty = False
-                        break
-                
+                text_block = df[text_cols].astype(str)
+                all_text_empty = not text_block.apply(lambda s: s.str.strip().ne('')).to_numpy().any()
+
                 if all_text_empty:
                     errors.append("All text columns are empty or contain only whitespace")
                     print("[is_csv_valid] All text columns empty or blanks")
@@ -315,19 +535,15 @@ def is_csv_valid():
                 errors.append(f"Error validating text columns: {e}")
                 print(f"[is_csv_valid] Error checking text columns: {e}")
 
-        numeric_cols = [c for c in df.columns if pd.api.types.is_numeric_dtype(df[c])]
         if not numeric_cols:
             errors.append("No numeric columns found")
             print("[is_csv_valid] No numeric columns found")
         else:
             try:
-                valid_numeric = False
-                for col in numeric_cols:
-                    meaningful_values = df[col].dropna().replace(0, pd.NA).dropna().shape[0]
-                    if meaningful_values > 0:
-                        valid_numeric = True
-                        break
-                
+                # One float array for all numeric columns; NaN compares != 0, so mask it out
+                values = df[numeric_cols].to_numpy(dtype=float, na_value=np.nan)
+                valid_numeric = ((values != 0) & ~np.isnan(values)).any()
+
                 if not valid_numeric:
                     errors.append("All numeric columns contain only zeros, nulls, or are empty")
                     print("[is_csv_valid] Numeric columns contain no meaningful data")
@@ -345,115 +561,233 @@ def is_csv_valid():
         traceback.print_exc()
         return False, errors
 
-def task_breakdown(file_path: str):
+def _run_candidate(model, prompt, variant, work_dir, code=None):
+    """
+    Generate one scraper for `prompt` (or take `code` as is), run it inside `work_dir`
+    and validate the CSV it writes there. `variant` keeps the cache entries of
+    concurrent candidates apart; the entry of a generated scraper that fails
+    validation is evicted, so a retry of the same prompt samples a new one.
+    """
+    generated = code is None
+    label = "[task_breakdown] [cached scraper]" if code else f"[task_breakdown] [candidate {variant + 1}]"
+    csv_path = os.path.join(work_dir, "scraped_data.csv")
+    result = {
+        "code": "",
+        "output": "",
+        "valid": False,
+        "errors": [],
+        "csv_path": csv_path,
+        "csv_created": False,
+        "csv_preview": "",
+    }
+
+    try:
+        if code is None:
+            response_text = cached_generate(model, prompt, variant=variant)
+            code_blocks = _CODE_BLOCK_RE.findall(response_text)
+            code = code_blocks[0].strip() if code_blocks else response_text.strip()
+
+        scraper_path = os.path.join(work_dir, "generated_scraper.py")
+        with open(scraper_path, "w", encoding="utf-8") as f:
+            f.write(code)
+        print(f"{label} Written scraper code to {scraper_path}")
+        
+        # Debug the generated code before running
+        debug_generated_code(scraper_path)
+
+    except Exception as e:
+        print(f"{label} Error generating code: {e}")
+        result["errors"] = [f"Error generating code: {e}"]
+        return result
+
+    result["code"] = code
+
+    try:
+        # Runs in a child of this process, so pandas/numpy are already imported
+        returncode, stdout, stderr = run_script(scraper_path, cwd=work_dir, timeout=60)
+        output = stdout + "\n" + stderr
+        print(f"{label} Scraper stdout:\n{stdout}")
+        print(f"{label} Scraper stderr:\n{stderr}")
+    
+    except TimeoutError:
+        output = "Execution timed out after 60 seconds"
+        print(f"{label} {output}")
+    except Exception:
+        output = f"Execution crashed:\n{traceback.format_exc()}"
+        print(f"{label} Exception running scraper:\n{output}")
+
+    result["output"] = output
+
+    if os.path.exists(csv_path):
+        size = os.path.getsize(csv_path)
+        print(f"{label} CSV file size after scraping: {size} bytes")
+        if size > 0:
+            try:
+                with open(csv_path, "r", encoding="utf-8") as f:
+                    snippet = f.read(500)
+                    print(f"{label} CSV file content preview:\n{snippet}")
+            except Exception as e:
+                print(f"{label} Could not preview CSV: {e}")
+        else:
+            print(f"{label} CSV file is empty")
+    else:
+        print(f"{label} CSV file does not exist after scraping")
+
+    postprocess_success = postprocess_csv(csv_path)
+    if not postprocess_success:
+        print(f"{label} Post-processing failed - likely malformed data")
+
+    # Read the processed CSV sample once for both validation and the feedback preview
+    csv_sample, csv_rows, csv_preview = None, None, None
+    if os.path.exists(csv_path):
+        try:
+            csv_rows = _count_csv_rows(csv_path)
+            csv_sample = pd.read_csv(csv_path, nrows=VALIDATION_SAMPLE_ROWS)
+        except Exception as e:
+            csv_preview = f"Failed to preview CSV: {e}"
+
+    valid, validation_errors = is_csv_valid(csv_path, df=csv_sample, n_rows=csv_rows)
+    result["valid"] = valid
+    result["errors"] = validation_errors
+    if valid:
+        print(f"{label} CSV is valid.")
+        return result
+    print(f"{label} CSV validation failed: {validation_errors}")
+    if generated:
+        evict(model, prompt, variant=variant)
+
+    if os.path.exists(csv_path):
+        result["csv_created"] = True
+        if csv_sample is not None:
+            csv_preview = csv_sample.head().to_csv(index=False)
+            print(f"{label} CSV preview:\n{csv_preview}")
+        else:
+            print(f"{label} {csv_preview}")
+    else:
+        csv_preview = "CSV file does not exist"
+        print(f"{label} CSV preview: File does not exist")
+    result["csv_preview"] = csv_preview
+
+    return result
+
+def _adopt_candidate(result):
+    """Copy a candidate's scraper and CSV to the paths the rest of the pipeline reads."""
+    if result["code"]:
+        with open(SCRAPER_PATH, "w", encoding="utf-8") as f:
+            f.write(result["code"])
+        print(f"[task_breakdown] Written scraper code to {SCRAPER_PATH}")
+    if os.path.exists(result["csv_path"]):
+        shutil.copyfile(result["csv_path"], CSV_PATH)
+
+def task_breakdown(file_path: str, question: str = None):
+    """
+    Generate, run and validate a scraper for the question in `file_path`. Callers that
+    already hold the question text pass it as `question` and the file is not re-read.
+    """
     print(f"[task_breakdown] Starting task breakdown with question file: {file_path}")
 
-    with open("DataScraping/task_breakdown.txt", "r", encoding="utf-8") as p:
-        base_prompt = p.read()
+    base_prompt = load_prompt(TASK_PROMPT_PATH)
 
-    with open(file_path, "r", encoding="utf-8") as q:
-        question = q.read()
+    if question is None:
+        with open(file_path, "r", encoding="utf-8") as q:
+            question = q.read()
+    else:
+        # Same newline normalization as reading the file in text mode
+        question = question.replace("\r\n", "\n").replace("\r", "\n")
 
-    with open("DataScraping/feedback_scraper.txt", "r", encoding="utf-8") as f:
-        feedback_template = f.read()
+    feedback_template = load_prompt(FEEDBACK_PROMPT_PATH)
 
     full_prompt = f"{base_prompt}\n\n{question}"
 
-    model = genai.GenerativeModel(model_name="gemini-2.0-flash")
+    model = get_model("gemini-2.0-flash")
+
+    # Look for a scraper that already worked for a similar question
+    urls = question_urls(question)
+    similarity, cached_code, same_urls = 0.0, None, False
+    try:
+        similarity, cached = SCRAPER_CACHE.search(question)
+        if isinstance(cached, dict):
+            cached_code, same_urls = cached["code"], bool(urls) and cached["urls"] == urls
+        else:
+            # Entry from before URLs were stored: only ever used as a seed
+            cached_code = cached
+        print(f"[task_breakdown] Closest cached scraper similarity: {similarity:.3f} (same URLs: {same_urls})")
+    except Exception as e:
+        print(f"[task_breakdown] Scraper cache lookup failed: {e}")
+
+    if cached_code and similarity >= SCRAPER_REUSE_SIMILARITY and same_urls:
+        work_dir = tempfile.mkdtemp(prefix="scraper_")
+        try:
+            result = _run_candidate(model, full_prompt, 0, work_dir, code=cached_code)
+            if result["valid"]:
+                _adopt_candidate(result)
+                print("[task_breakdown] Cached scraper produced a valid CSV. Skipping generation.")
+                return result["code"]
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+        print("[task_breakdown] Cached scraper failed, generating a new one")
+    elif cached_code and similarity >= SCRAPER_SEED_SIMILARITY:
+        full_prompt += (
+            "\n\nA scraper that worked for a similar question is below; adapt it if it helps:\n"
+            f"```python\n{cached_code}\n```"
+        )
 
     attempts = 0
     max_attempts = 5
     code = ""
-    output = ""
 
     while attempts < max_attempts:
-        print(f"--- Attempt {attempts + 1}/{max_attempts} ---")
-
-        try:
-            response = model.generate_content(full_prompt)
-            code_blocks = re.findall(r"```(?:python)?\n(.*?)```", response.text, re.DOTALL)
-            code = code_blocks[0].strip() if code_blocks else response.text.strip()
-
-            scraper_path = os.path.join("DataScraping", "generated_scraper.py")
-            with open(scraper_path, "w", encoding="utf-8") as f:
-                f.write(code)
-            print(f"[task_breakdown] Written scraper code to {scraper_path}")
-            
-            # Debug the generated code before running
-            debug_generated_code(scraper_path)
-
-        except Exception as e:
-            print(f"[task_breakdown] Error generating code: {e}")
-            attempts += 1
-            continue
-
-        try:
-            result = subprocess.run(
-                ["python", scraper_path],
-                capture_output=True,
-                text=True,
-                timeout=60,
-                cwd=PROJECT_ROOT
-            )
-            output = result.stdout + "\n" + result.stderr
-            print(f"[task_breakdown] Scraper stdout:\n{result.stdout}")
-            print(f"[task_breakdown] Scraper stderr:\n{result.stderr}")
-        
-        except subprocess.TimeoutExpired:
-            output = "Execution timed out after 60 seconds"
-            print(f"[task_breakdown] {output}")
-        except Exception:
-            output = f"Execution crashed:\n{traceback.format_exc()}"
-            print(f"[task_breakdown] Exception running scraper:\n{output}")
-
-        if os.path.exists(CSV_PATH):
-            size = os.path.getsize(CSV_PATH)
-            print(f"[task_breakdown] CSV file size after scraping: {size} bytes")
-            if size > 0:
+        print(f"--- Attempt {attempts + 1}/{max_attempts} ({CANDIDATES_PER_ATTEMPT} candidates) ---")
+
+        # Generate and run several candidates at once, each in its own directory so
+        # their CSVs don't collide; take the first one that produces a valid CSV
+        work_dirs = [tempfile.mkdtemp(prefix="scraper_") for _ in range(CANDIDATES_PER_ATTEMPT)]
+        executor = ThreadPoolExecutor(max_workers=CANDIDATES_PER_ATTEMPT)
+        futures = {
+            executor.submit(_run_candidate, model, full_prompt, variant, work_dir): work_dir
+            for variant, work_dir in enumerate(work_dirs)
+        }
+
+        winner = None
+        failures = []
+        for future in as_completed(futures):
+            result = future.result()
+            if result["valid"]:
+                winner = result
+                break
+            failures.append(result)
+
+        # Keep the winner, or the failure with the fewest problems for the feedback prompt
+        chosen = winner or min(failures, key=lambda r: (not r["code"], len(r["errors"])))
+        _adopt_candidate(chosen)
+        code = chosen["code"] or code
+
+        # Don't wait for the slower candidates; each directory is removed once its candidate is done
+        executor.shutdown(wait=False, cancel_futures=True)
+        for future, work_dir in futures.items():
+            future.add_done_callback(lambda _, d=work_dir: shutil.rmtree(d, ignore_errors=True))
+
+        if winner is not None:
+            print("[task_breakdown] CSV is valid. Breaking loop.")
+            if winner["code"] != cached_code:
                 try:
-                    with open(CSV_PATH, "r", encoding="utf-8") as f:
-                        snippet = f.read(500)
-                        print(f"[task_breakdown] CSV file content preview:\n{snippet}")
+                    SCRAPER_CACHE.add(question, {"code": winner["code"], "urls": urls})
                 except Exception as e:
-                    print(f"[task_breakdown] Could not preview CSV: {e}")
-            else:
-                print("[task_breakdown] CSV file is empty")
-        else:
-            print("[task_breakdown] CSV file does not exist after scraping")
-
-        postprocess_success = postprocess_csv()
-        if not postprocess_success:
-            print("[task_breakdown] Post-processing failed - likely malformed data")
-
-        valid, validation_errors = is_csv_valid()
-        if valid:
-            print("[task_breakdown] CSV is valid. Breaking loop.")
+                    print(f"[task_breakdown] Could not cache scraper: {e}")
             break
-        else:
-            print(f"[task_breakdown] CSV validation failed: {validation_errors}")
 
-        if os.path.exists(CSV_PATH):
-            try:
-                df = pd.read_csv(CSV_PATH)
-                csv_preview = df.head().to_csv(index=False)
-                print(f"[task_breakdown] CSV preview:\n{csv_preview}")
-            except Exception as e:
-                csv_preview = f"Failed to preview CSV: {e}"
-                print(f"[task_breakdown] {csv_preview}")
-        else:
-            csv_preview = "CSV file does not exist"
-            print("[task_breakdown] CSV preview: File does not exist")
-
-        # Enhanced error context for feedback
-        error_summary = "; ".join(validation_errors) if validation_errors else "Unknown validation errors"
-        
-        full_prompt = feedback_template.format(
-            previous_code=code,
-            output=output,
-            csv_status="was created" if os.path.exists(CSV_PATH) else "was NOT created",
-            csv_preview=csv_preview,
-            errors=error_summary
-        )
+        # Enhanced error context for feedback; if no candidate produced code, retry the same prompt
+        if chosen["code"]:
+            validation_errors = chosen["errors"]
+            error_summary = "; ".join(validation_errors) if validation_errors else "Unknown validation errors"
+            
+            full_prompt = feedback_template.format(
+                previous_code=chosen["code"],
+                output=chosen["output"],
+                csv_status="was created" if chosen["csv_created"] else "was NOT created",
+                csv_preview=chosen["csv_preview"],
+                errors=error_summary
+            )
 
         attempts += 1
 
@@ -0,0 +1,236 @@
+import contextlib
+import functools
+import hashlib
+import os
+import re
+import tempfile
+import threading
+import time
+
+import orjson
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+CACHE_DIR = os.path.join(BASE_DIR, ".llm_cache")
+DEFAULT_TTL = 24 * 60 * 60  # seconds
+EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+
+_URL_RE = re.compile(r"https?://[^\s<>\"'`)\]]+")
+_NUMBER_RE = re.compile(r"\d+(?:[.,]\d+)*")
+
+
+@functools.lru_cache(maxsize=1)
+def _configure_genai():
+    import google.generativeai as genai
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+    return genai
+
+
+@functools.lru_cache(maxsize=None)
+def get_model(model_name):
+    """
+    Process-wide GenerativeModel for `model_name`. The SDK is configured and each
+    model (with its client and open connection) is created on first use only, then
+    shared by every caller and thread.
+    """
+    return _configure_genai().GenerativeModel(model_name)
+
+
+@functools.lru_cache(maxsize=16)
+def _read_prompt(path, mtime_ns):
+    with open(path, "r", encoding="utf-8") as f:
+        return f.read()
+
+
+def load_prompt(path):
+    """Contents of a prompt template file, re-read only when its mtime changes."""
+    path = os.path.abspath(path)
+    return _read_prompt(path, os.stat(path).st_mtime_ns)
+
+
+def cache_key(model_name, prompt, variant=0):
+    # Prompts embed the scraped data, so this serializes large strings on every call
+    payload = orjson.dumps({"model": model_name, "prompt": prompt, "variant": variant}, option=orjson.OPT_SORT_KEYS)
+    return hashlib.sha256(payload).hexdigest()
+
+
+def cached_generate(model, prompt, variant=0, ttl=DEFAULT_TTL, cache_dir=CACHE_DIR):
+    """
+    Return the text of model.generate_content(prompt), served from an on-disk
+    cache when the same model answered the same prompt less than `ttl` seconds ago.
+    Distinct `variant`s get separate entries, for callers that want several
+    independent generations of one prompt. `prompt` may also be a list of
+    content parts (e.g. a stable prefix followed by the variable question).
+    """
+    key = cache_key(model.model_name, prompt, variant)
+    path = os.path.join(cache_dir, f"{key}.txt")
+
+    if os.path.exists(path) and time.time() - os.path.getmtime(path) < ttl:
+        with open(path, "r", encoding="utf-8") as f:
+            text = f.read()
+        print(f"[llmcache] Cache hit for prompt {key[:12]}")
+        return text
+
+    # Stream the response straight into the cache file so writing overlaps with generation
+    chunks = []
+    with _atomic_file(path) as f:
+        for chunk in model.generate_content(prompt, stream=True):
+            piece = "".join(getattr(part, "text", "") for part in chunk.parts)
+            f.write(piece)
+            chunks.append(piece)
+        text = "".join(chunks)
+        if not text.strip():
+            raise ValueError("Model returned an empty response")
+    print(f"[llmcache] Cached response for prompt {key[:12]}")
+    return text
+
+
+def cached_generate_candidates(model, prompt, count, ttl=DEFAULT_TTL, cache_dir=CACHE_DIR):
+    """
+    Like cached_generate, but asks for `count` alternative responses in a single
+    request (candidate_count) and returns the texts of the non-empty ones as a list.
+    """
+    key = cache_key(model.model_name, prompt, f"candidates:{count}")
+    path = os.path.join(cache_dir, f"{key}.json")
+
+    if os.path.exists(path) and time.time() - os.path.getmtime(path) < ttl:
+        with open(path, "rb") as f:
+            texts = orjson.loads(f.read())
+        print(f"[llmcache] Cache hit for prompt {key[:12]} ({len(texts)} candidates)")
+        return texts
+
+    response = model.generate_content(prompt, generation_config={"candidate_count": count})
+    texts = []
+    for candidate in response.candidates:
+        text = "".join(getattr(part, "text", "") for part in candidate.content.parts)
+        if text.strip():
+            texts.append(text)
+    if not texts:
+        raise ValueError("Model returned no usable candidates")
+
+    _write_atomic(path, orjson.dumps(texts).decode())
+    print(f"[llmcache] Cached {len(texts)} candidates for prompt {key[:12]}")
+    return texts
+
+
+def evict(model, prompt, variant=0, cache_dir=CACHE_DIR):
+    """Drop the cached_generate entry for `prompt`, e.g. because the code it holds failed."""
+    _remove_entry(os.path.join(cache_dir, f"{cache_key(model.model_name, prompt, variant)}.txt"))
+
+
+def evict_candidates(model, prompt, count, cache_dir=CACHE_DIR):
+    """Drop the cached_generate_candidates entry for `prompt`."""
+    _remove_entry(os.path.join(cache_dir, f"{cache_key(model.model_name, prompt, f'candidates:{count}')}.json"))
+
+
+def _remove_entry(path):
+    try:
+        os.remove(path)
+        print(f"[llmcache] Evicted {os.path.basename(path)[:12]}")
+    except FileNotFoundError:
+        pass
+
+
+@contextlib.contextmanager
+def _atomic_file(path, mode="w"):
+    # Write to a private temp file and rename it into place, so a concurrent reader
+    # (or a crash mid-write) never sees a truncated entry
+    cache_dir = os.path.dirname(path)
+    os.makedirs(cache_dir, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix=".tmp")
+    try:
+        with os.fdopen(fd, mode, encoding=None if "b" in mode else "utf-8") as f:
+            yield f
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
+def _write_atomic(path, text):
+    with _atomic_file(path) as f:
+        f.write(text)
+
+
+@functools.lru_cache(maxsize=1)
+def _get_embedder():
+    # Imported lazily: sentence-transformers pulls in torch, which takes seconds to load
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(EMBEDDING_MODEL)
+
+
+def embed(text):
+    """Unit-normalized float32 embedding of `text`, shaped (1, dim) for FAISS."""
+    return _get_embedder().encode([text], normalize_embeddings=True).astype("float32")
+
+
+def question_urls(text):
+    """Sorted distinct URLs mentioned in `text`, without trailing punctuation."""
+    return sorted({url.rstrip(".,;:!?") for url in _URL_RE.findall(text)})
+
+
+def question_numbers(text):
+    """Numeric tokens of `text` outside its URLs, in order (e.g. ["2", "2000"])."""
+    return _NUMBER_RE.findall(_URL_RE.sub(" ", text))
+
+
+class SemanticCache:
+    """
+    Nearest-neighbour cache mapping texts to values by cosine similarity of their
+    local sentence embeddings. Persisted under cache_dir as a FAISS inner-product
+    index (<name>.faiss) plus the values in insertion order (<name>.json).
+    """
+
+    def __init__(self, name, cache_dir=CACHE_DIR):
+        self.index_path = os.path.join(cache_dir, f"{name}.faiss")
+        self.values_path = os.path.join(cache_dir, f"{name}.json")
+        self._index = None
+        self._values = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        import faiss
+
+        if self._index is not None:
+            return
+        if os.path.exists(self.index_path) and os.path.exists(self.values_path):
+            try:
+                index = faiss.read_index(self.index_path)
+                with open(self.values_path, "rb") as f:
+                    values = orjson.loads(f.read())
+                if index.ntotal == len(values):
+                    self._index, self._values = index, values
+                    return
+                print(f"[llmcache] {self.index_path} has {index.ntotal} vectors for {len(values)} values, starting over")
+            except Exception as e:
+                print(f"[llmcache] Could not load {self.index_path}, starting over: {e}")
+        dim = _get_embedder().get_sentence_embedding_dimension()
+        self._index = faiss.IndexFlatIP(dim)
+        self._values = []
+
+    def search(self, text):
+        """Return (similarity, value) of the closest cached text, or (0.0, None) if the cache is empty."""
+        vector = embed(text)
+        with self._lock:
+            self._load()
+            if self._index.ntotal == 0:
+                return 0.0, None
+            scores, ids = self._index.search(vector, 1)
+            return float(scores[0, 0]), self._values[ids[0, 0]]
+
+    def add(self, text, value):
+        import faiss
+
+        vector = embed(text)
+        with self._lock:
+            self._load()
+            self._index.add(vector)
+            self._values.append(value)
+            # Each file is replaced atomically, values first: a crash in between leaves an index
+            # one entry short of its values, which _load detects and discards
+            with _atomic_file(self.values_path, "wb") as f:
+                f.write(orjson.dumps(self._values))
+            with _atomic_file(self.index_path, "wb") as f:
+                f.write(faiss.serialize_index(self._index).tobytes())
@@ -0,0 +1,131 @@
+import contextlib
+import io
+import multiprocessing
+import multiprocessing.connection
+import os
+import runpy
+import traceback
+
+# Heavy modules loaded once by the warm server process that every script run is forked from.
+# Generated answer scripts plot with matplotlib, so pyplot (font cache, backends) is warmed as well.
+PRELOAD_MODULES = [
+    "DataScraping.runner", "pandas", "numpy", "pyarrow", "requests", "requests_cache", "bs4", "lxml",
+    "matplotlib", "matplotlib.pyplot",
+]
+
+# Scripts only ever render plots to files/buffers; a headless backend lets pyplot load without a display
+os.environ.setdefault("MPLBACKEND", "Agg")
+
+# Shared HTTP cache for generated scripts, so retries and repeated runs don't re-download the same pages
+HTTP_CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".http_cache")
+HTTP_CACHE_TTL = 60 * 60  # seconds
+
+
+def _get_context():
+    """
+    Prefer the forkserver start method: a single warm server process, started on
+    first use, imports PRELOAD_MODULES once and forks every script run from itself.
+    Unlike forking the API process directly this is safe while other threads
+    (uvicorn, concurrent scraper candidates) are running.
+    """
+    if "forkserver" not in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context()
+    ctx = multiprocessing.get_context("forkserver")
+    ctx.set_forkserver_preload(PRELOAD_MODULES)
+    return ctx
+
+
+_CONTEXT = _get_context()
+
+
+def _exec_script(script_path, cwd, conn, entry_point=None):
+    """
+    Child side of run_script: run the script as __main__, call its `entry_point`
+    function if it defines one, and send back (returncode, stdout, stderr, value).
+    """
+    stdout, stderr = io.StringIO(), io.StringIO()
+    returncode = 0
+    value = None
+    with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr):
+        try:
+            import requests_cache
+
+            # Patches requests.Session, so every requests.get / Session the script makes goes through the cache
+            requests_cache.install_cache(HTTP_CACHE_PATH, backend="sqlite", expire_after=HTTP_CACHE_TTL,
+                                         allowable_methods=("GET",))
+            os.chdir(cwd)
+            namespace = runpy.run_path(script_path, run_name="__main__")
+            func = namespace.get(entry_point) if entry_point else None
+            if callable(func):
+                value = func()
+        except SystemExit as e:
+            if isinstance(e.code, int):
+                returncode = e.code
+            elif e.code is not None:
+                print(e.code, file=stderr)
+                returncode = 1
+        except BaseException:
+            traceback.print_exc()
+            returncode = 1
+    try:
+        conn.send((returncode, stdout.getvalue(), stderr.getvalue(), value))
+    except Exception as e:
+        # The return value could not be pickled back to the parent
+        conn.send((1, stdout.getvalue(), stderr.getvalue() + f"\n{entry_point}() returned an unsendable value: {e}", None))
+    conn.close()
+
+
+def run_script(script_path, cwd, timeout=60, entry_point=None):
+    """
+    Run a generated Python script in a child forked from the warm server process,
+    so each run skips interpreter startup and the imports of pandas, numpy,
+    requests, ... (see _get_context). Returns (returncode, stdout, stderr);
+    raises TimeoutError and kills the child if it runs longer than `timeout` seconds.
+
+    With `entry_point`, a function of that name defined by the script is called after
+    the script ran and its return value comes back in memory as a fourth element
+    (None if the script defines no such function or failed).
+    """
+    recv_conn, send_conn = _CONTEXT.Pipe(duplex=False)
+    proc = _CONTEXT.Process(
+        target=_exec_script,
+        args=(os.path.abspath(script_path), cwd, send_conn, entry_point),
+    )
+    proc.start()
+    send_conn.close()
+
+    try:
+        # Block until the child reports back or exits (its sentinel), whichever comes first
+        ready = multiprocessing.connection.wait([recv_conn, proc.sentinel], timeout)
+        if not ready:
+            raise TimeoutError(f"Execution timed out after {timeout} seconds")
+        try:
+            if recv_conn in ready or recv_conn.poll():
+                result = recv_conn.recv()
+            else:
+                raise EOFError
+        except EOFError:
+            # The child died without reporting back (e.g. killed by a signal)
+            proc.join()
+            result = (proc.exitcode or 1, "", f"Script process exited abnormally with code {proc.exitcode}", None)
+        return result if entry_point else result[:3]
+    finally:
+        recv_conn.close()
+        if proc.is_alive():
+            proc.kill()
+        proc.join()
+
+
+def _noop():
+    pass
+
+
+def warm_up():
+    """
+    Start the warm server process now rather than on the first run_script call:
+    runs a no-op child, which returns once PRELOAD_MODULES are imported, so the
+    first generated script doesn't pay for starting the server and the imports.
+    """
+    proc = _CONTEXT.Process(target=_noop)
+    proc.start()
+    proc.join()
@@ -1,15 +1,35 @@
 import os
+import functools
+import hashlib
 import json
+import orjson
 import re
+import time
 import traceback
-import subprocess
-from dotenv import load_dotenv
-import google.generativeai as genai
-from DataScraping.csv2json import csv_to_json
+from DataScraping.llmcache import (
+    SemanticCache, cached_generate, cached_generate_candidates, evict, evict_candidates, get_model, load_prompt,
+    question_numbers, question_urls,
+)
+from DataScraping.runner import run_script
 
-load_dotenv()
-genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
-MODEL = genai.GenerativeModel("gemini-1.5-flash")
+MODEL_NAME = "gemini-1.5-flash"
+# Generated answer code is reused for a week; the prompts embed the full data, so a hit means identical inputs.
+# Entries whose code failed are evicted (see _code_sources), so only working or not yet run code lives that long
+ANSWER_CACHE_TTL = 7 * 24 * 60 * 60  # seconds
+# Answer code that ran successfully, keyed by the question text and stored with the question's
+# URLs and numbers. A paraphrase of a cached question at or above ANSWER_REUSE_SIMILARITY reuses
+# that code without asking Gemini, but only if its URLs and numbers (thresholds, years, ...) are
+# identical: the code hard-codes them, and questions differing only there embed almost identically.
+ANSWER_CODE_CACHE = SemanticCache("answers")
+ANSWER_REUSE_SIMILARITY = 0.95
+# Alternative revisions requested per feedback call; all are tried locally before asking again
+REVISION_CANDIDATES = 3
+# A revision request rejected for rate limiting (429) is retried up to RATE_LIMIT_RETRIES times,
+# waiting RATE_LIMIT_BACKOFF * 2**n seconds before retry n
+RATE_LIMIT_RETRIES = 4
+RATE_LIMIT_BACKOFF = 0.5  # seconds
+# Failures caused by the environment rather than the code; rerunning or revising won't fix them
+UNRETRYABLE_ERRORS = ("ModuleNotFoundError", "PermissionError")
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 SCRAPED_PATH = os.path.join(BASE_DIR, "scraped_data.json")
@@ -19,100 +39,226 @@ OUTPUT_CODE_PATH = os.path.join(BASE_DIR, "output_code.py")
 FINAL_OUTPUT_PATH = os.path.join(BASE_DIR, "final_output.json")
 FEEDBACK_PATH = os.path.join(BASE_DIR, "feedback_processing.txt")
 
+
+# Above this many characters the serialized data is replaced in the prompt by a summary
+# (columns, row count, first PROMPT_SAMPLE_ROWS rows); the generated code loads the full file itself
+PROMPT_DATA_MAX_CHARS = 50_000
+PROMPT_SAMPLE_ROWS = 20
+
+# Parsed scraped_data.json and its prompt form, reused until the file changes
+_scraped_cache = {"mtime": None, "data": None, "json": None}
+
+# Generated code -> callable dropping the LLM cache entry it came from. Code that fails is evicted,
+# so the same prompt is sampled afresh next time instead of replaying the failure from disk
+_code_sources = {}
+
+# Hash and mtime of the code last written to output_code.py, to skip rewriting identical code
+_output_code_state = {"hash": None, "mtime": None}
+
+_MD_FENCE = re.compile(r"^```(?:python)?\s*|```$", re.MULTILINE)
+
 def clean_markdown(code):
-    return re.sub(r"^```(?:python)?\s*|```$", "", code.strip(), flags=re.MULTILINE)
+    # Newlines normalized as in text-mode reads of output_code.py, so _code_sources lookups
+    # match the code run_code_and_save_answer reads back
+    code = code.replace("\r\n", "\n").replace("\r", "\n")
+    return _MD_FENCE.sub("", code.strip())
 
-def generate_initial_code(question_text: str):
+def _load_scraped():
+    mtime = os.stat(SCRAPED_PATH).st_mtime_ns
+    if _scraped_cache["mtime"] != mtime:
+        print("[DEBUG] Loading scraped_data.json...")
+        with open(SCRAPED_PATH, "rb") as f:
+            data = orjson.loads(f.read())
+        # Compact (no indentation: far fewer prompt tokens) with sorted keys, so the
+        # serialized data, and so the prompt prefix, is deterministic
+        data_json = orjson.dumps(data, option=orjson.OPT_SORT_KEYS).decode()
+        if len(data_json) > PROMPT_DATA_MAX_CHARS and isinstance(data, list) and data and isinstance(data[0], dict):
+            print(f"[DEBUG] Scraped data is {len(data_json)} chars, sending a {PROMPT_SAMPLE_ROWS}-row sample instead")
+            summary = {
+                "path": os.path.basename(SCRAPED_PATH),
+                "columns": list(dict.fromkeys(key for row in data if isinstance(row, dict) for key in row)),
+                "n_rows": len(data),
+                "sample": data[:PROMPT_SAMPLE_ROWS],
+            }
+            data_json = orjson.dumps(summary, option=orjson.OPT_SORT_KEYS).decode()
+        _scraped_cache.update(mtime=mtime, data=data, json=data_json)
+    return _scraped_cache["data"], _scraped_cache["json"]
+
+def write_output_code(code):
+    data = code.encode("utf-8")
+    digest = hashlib.sha256(data).hexdigest()
     try:
-        print("[DEBUG] Converting CSV to JSON...")
-        csv_to_json()
-    except Exception as e:
-        print(f"[ERROR] CSV to JSON conversion failed: {e}")
-        raise RuntimeError(f"CSV to JSON conversion failed: {e}")
+        if digest == _output_code_state["hash"] and os.stat(OUTPUT_CODE_PATH).st_mtime_ns == _output_code_state["mtime"]:
+            return
+    except FileNotFoundError:
+        pass
 
-    with open(SCRAPED_PATH, "r", encoding="utf-8") as f:
-        data = json.load(f)
+    # One buffered write to a temp file, then an atomic rename into place
+    tmp_path = OUTPUT_CODE_PATH + ".tmp"
+    with open(tmp_path, "wb", buffering=64 * 1024) as f:
+        f.write(data)
+    os.replace(tmp_path, OUTPUT_CODE_PATH)
+    _output_code_state.update(hash=digest, mtime=os.stat(OUTPUT_CODE_PATH).st_mtime_ns)
 
-    with open(ANSWER_PROMPT_PATH, "r", encoding="utf-8") as f:
-        template = f.read()
+def preload_prompts():
+    """Read the prompt templates into load_prompt's cache ahead of code generation."""
+    load_prompt(ANSWER_PROMPT_PATH)
+    load_prompt(FEEDBACK_PATH)
+
+def generate_initial_code(question_text: str):
+    # scraped_data.json is produced by the caller (csv_to_json right after scraping);
+    # converting again here would only rewrite the same file and force a re-parse
+    try:
+        similarity, cached = ANSWER_CODE_CACHE.search(question_text)
+        print(f"[DEBUG] Closest cached answer code similarity: {similarity:.3f}")
+        # Entries from before URLs and numbers were stored are plain code strings and never reused
+        if isinstance(cached, dict) and similarity >= ANSWER_REUSE_SIMILARITY:
+            if cached["constants"] == _question_constants(question_text):
+                print("[DEBUG] Reusing cached answer code for a similar question.")
+                return cached["code"]
+            print("[DEBUG] Similar cached question has different URLs or numbers, not reusing its code.")
+    except Exception as e:
+        print(f"[ERROR] Answer code cache lookup failed: {e}")
 
-    full_prompt = template.format(data=json.dumps(data, indent=2), questions=question_text)
+    _, data_json = _load_scraped()
+    # answer_prompt.txt ends with the questions. Everything before them (instructions + data) is sent
+    # as a separate first content part that is byte-identical for every question about the same data,
+    # so the provider can serve it from its prompt cache. Templates are memoized by mtime (load_prompt).
+    prefix_template = load_prompt(ANSWER_PROMPT_PATH).split("{questions}")[0]
+    contents = [prefix_template.format(data=data_json), question_text]
     print("[DEBUG] Sending prompt to Gemini model...")
-    response = MODEL.generate_content(full_prompt)
-    return clean_markdown(response.text)
+    model = get_model(MODEL_NAME)
+    code = clean_markdown(cached_generate(model, contents, ttl=ANSWER_CACHE_TTL))
+    _code_sources[code] = functools.partial(evict, model, contents)
+    return code
 
 def generate_and_save_code(question_text: str):
     try:
         code = generate_initial_code(question_text)
-        with open(OUTPUT_CODE_PATH, "w", encoding="utf-8") as f:
-            f.write(code)
+        write_output_code(code)
         print(f"[DEBUG] Code successfully generated and saved to {OUTPUT_CODE_PATH}")
         return {"status": "success", "message": "Code saved to output_code.py"}
     except Exception as e:
         print(f"[ERROR] Code generation failed: {e}")
         return {"status": "error", "message": f"Code generation failed: {e}"}
 
+def _is_retryable(stderr):
+    return not any(f"{name}:" in stderr for name in UNRETRYABLE_ERRORS)
+
 def revise_code(code, error_msg, output):
+    # Imported here: the Gemini SDK is only loaded once a request actually needs it (see llmcache)
+    from google.api_core.exceptions import ResourceExhausted
+
     print("[DEBUG] Revising code due to error...")
     print(f"[DEBUG] Error Msg: {error_msg}")
     print(f"[DEBUG] Output:\n{output[:500]}...")  # print first 500 chars
-    with open(FEEDBACK_PATH, "r", encoding="utf-8") as f:
-        feedback_template = f.read()
+    feedback_prompt = load_prompt(FEEDBACK_PATH).format(code=code, status=error_msg, output=output)
+    model = get_model(MODEL_NAME)
+    # Cache hits never reach Gemini, so only real requests can be rate limited and wait
+    for retry in range(RATE_LIMIT_RETRIES + 1):
+        try:
+            texts = cached_generate_candidates(model, feedback_prompt, REVISION_CANDIDATES, ttl=ANSWER_CACHE_TTL)
+            break
+        except ResourceExhausted as e:
+            if retry == RATE_LIMIT_RETRIES:
+                raise
+            delay = RATE_LIMIT_BACKOFF * 2 ** retry
+            print(f"[DEBUG] Rate limited by Gemini ({e}), retrying in {delay}s")
+            time.sleep(delay)
+    print(f"[DEBUG] Received {len(texts)} revision candidates")
+    codes = [clean_markdown(text) for text in texts]
+    # All candidates share one cache entry; it is dropped as soon as any of them fails
+    source = functools.partial(evict_candidates, model, feedback_prompt, REVISION_CANDIDATES)
+    for revised in codes:
+        _code_sources[revised] = source
+    return codes
 
-    feedback_prompt = feedback_template.format(code=code, status=error_msg, output=output)
-    response = MODEL.generate_content(feedback_prompt)
-    return clean_markdown(response.text)
+def _forget_failed_code(code):
+    source = _code_sources.pop(code, None)
+    if source:
+        source()
 
 def run_code_with_retries(code, retries=5):
     last_stdout, last_stderr = "", ""
+    # Codes still to try; Gemini is only asked for new revisions once every pending candidate has failed,
+    # and only when an attempt is left to run them: revisions that never run would sit unverified
+    # in the LLM cache for ANSWER_CACHE_TTL
+    candidates = [code]
+    feedback = None  # revise_code arguments for the last failure
     for attempt in range(retries):
         print(f"\n[DEBUG] ===== Attempt {attempt+1}/{retries} =====")
+        if not candidates:
+            try:
+                candidates = revise_code(*feedback)
+            except Exception as e:
+                # e.g. still rate limited after RATE_LIMIT_RETRIES, or no usable candidates
+                print(f"[ERROR] Could not get revisions from Gemini: {e}")
+                traceback.print_exc()
+                last_stderr = f"{last_stderr}\nRevision request failed: {e}".lstrip()
+                break
+        code = candidates.pop(0)
         try:
-            with open(OUTPUT_CODE_PATH, "w", encoding="utf-8") as f:
-                f.write(code)
+            write_output_code(code)
+
+            # A final_output.json left by an earlier attempt or run must not pass for this attempt's answer
+            if os.path.exists(FINAL_OUTPUT_PATH):
+                os.remove(FINAL_OUTPUT_PATH)
 
-            print(f"[DEBUG] Running subprocess: python {OUTPUT_CODE_PATH}")
-            result = subprocess.run(
-                ["python", OUTPUT_CODE_PATH],
-                cwd=BASE_DIR,
-                capture_output=True,
-                text=True,
-                timeout=60
-            )
+            # Forked from the warm runner process: no interpreter start-up or pandas/matplotlib re-import per attempt.
+            # The script's answer() is called there and its return value comes back in memory.
+            print(f"[DEBUG] Running script: {OUTPUT_CODE_PATH}")
+            returncode, stdout, stderr, result = run_script(OUTPUT_CODE_PATH, BASE_DIR, timeout=60, entry_point="answer")
 
-            last_stdout, last_stderr = result.stdout, result.stderr
+            last_stdout, last_stderr = stdout, stderr
 
-            print(f"[DEBUG] Return code: {result.returncode}")
-            print(f"[DEBUG] STDOUT:\n{result.stdout}")
-            print(f"[DEBUG] STDERR:\n{result.stderr}")
+            print(f"[DEBUG] Return code: {returncode}")
+            print(f"[DEBUG] STDOUT:\n{stdout}")
+            print(f"[DEBUG] STDERR:\n{stderr}")
 
-            if result.returncode != 0 or result.stderr.strip():
+            if returncode != 0 or stderr.strip():
+                _forget_failed_code(code)
+                if not _is_retryable(stderr):
+                    # Don't ask Gemini to revise; only alternatives already pending are still tried
+                    print("[ERROR] Unrecoverable error, no revision requested.")
+                    if candidates:
+                        continue
+                    break
                 error_msg = f"Attempt {attempt+1} failed (non-zero exit or stderr)"
-                code = revise_code(code, error_msg, f"STDOUT:\n{result.stdout}\nSTDERR:\n{result.stderr}")
+                feedback = (code, error_msg, f"STDOUT:\n{stdout}\nSTDERR:\n{stderr}")
                 continue
 
-            if not os.path.exists(FINAL_OUTPUT_PATH):
-                error_msg = f"Attempt {attempt+1} failed: {FINAL_OUTPUT_PATH} not found"
-                code = revise_code(code, error_msg, f"STDOUT:\n{result.stdout}\nSTDERR:\n{result.stderr}")
+            if result is not None:
+                # Round-trip through orjson so numpy scalars/arrays and NaN become plain JSON values
+                data = orjson.loads(orjson.dumps(result, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS))
+            elif os.path.exists(FINAL_OUTPUT_PATH):
+                # Scripts without answer() (e.g. older cached code) hand over their result through the file.
+                # Stdlib parser on purpose: such scripts may write NaN/Infinity, which orjson rejects
+                with open(FINAL_OUTPUT_PATH, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+            else:
+                _forget_failed_code(code)
+                error_msg = f"Attempt {attempt+1} failed: answer() returned nothing and {FINAL_OUTPUT_PATH} not found"
+                feedback = (code, error_msg, f"STDOUT:\n{stdout}\nSTDERR:\n{stderr}")
                 continue
 
-            with open(FINAL_OUTPUT_PATH, "r", encoding="utf-8") as f:
-                data = json.load(f)
-
             if isinstance(data, dict) and "error" in data:
-                error_msg = f"Attempt {attempt+1} failed: output file contains error"
-                code = revise_code(code, error_msg, json.dumps(data, indent=2))
+                _forget_failed_code(code)
+                error_msg = f"Attempt {attempt+1} failed: result contains error"
+                feedback = (code, error_msg, orjson.dumps(data, option=orjson.OPT_INDENT_2).decode())
                 continue
 
             print("[DEBUG] Successfully generated final output.")
+            _code_sources.clear()
             return data
 
         except Exception as e:
             print(f"[ERROR] Exception in attempt {attempt+1}: {e}")
             traceback.print_exc()
-            code = revise_code(code, f"Exception: {str(e)}", traceback.format_exc())
+            _forget_failed_code(code)
+            feedback = (code, f"Exception: {str(e)}", traceback.format_exc())
 
     print("[ERROR] All attempts failed.")
+    _code_sources.clear()
     return {
         "error": "All attempts failed",
         "last_code": code,
@@ -120,7 +266,20 @@ def run_code_with_retries(code, retries=5):
         "last_stderr": last_stderr
     }
 
-def run_code_and_save_answer():
+def _question_constants(question_text):
+    return {"urls": question_urls(question_text), "numbers": question_numbers(question_text)}
+
+def remember_answer_code(question_text, code):
+    # Only code that produced a valid answer is cached
+    try:
+        entry = {"code": code, "constants": _question_constants(question_text)}
+        _, cached = ANSWER_CODE_CACHE.search(question_text)
+        if cached != entry:
+            ANSWER_CODE_CACHE.add(question_text, entry)
+    except Exception as e:
+        print(f"[ERROR] Could not cache answer code: {e}")
+
+def run_code_and_save_answer(question_text=None):
     try:
         print("[DEBUG] Reading generated code from output_code.py...")
         with open(OUTPUT_CODE_PATH, "r", encoding="utf-8") as f:
@@ -135,6 +294,10 @@ def run_code_and_save_answer():
 
         if isinstance(result, (dict, list)):
             print("[DEBUG] Final result succeeded.")
+            if question_text:
+                # run_code_with_retries leaves the code of the successful attempt in output_code.py
+                with open(OUTPUT_CODE_PATH, "r", encoding="utf-8") as f:
+                    remember_answer_code(question_text, f.read())
             return {"status": "success", "answer": result}
 
         print("[ERROR] Generated result is invalid.")
@@ -1,19 +1,45 @@
 import os
+import asyncio
+import hashlib
+import time
+from contextlib import asynccontextmanager
 import uvicorn
 from fastapi import FastAPI, UploadFile, File, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-import json
 
 from DataScraping.datascraper import task_breakdown
 import answer
 from DataScraping.csv2json import csv_to_json  # 🔹 import csv2json
+from DataScraping.runner import warm_up
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 SCRAPED_PATH = os.path.join(BASE_DIR, "DataScraping", "scraped_data.json")
 QUESTION_PATH = os.path.join(BASE_DIR, "question1.txt")
-FINAL_OUTPUT_PATH = os.path.join(BASE_DIR, "final_output.json")
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app):
+    # Start the script runner's warm process (pandas, matplotlib, ... preloaded) before serving,
+    # so the first /api request doesn't pay for it
+    print("[Startup] Warming up script runner...")
+    await asyncio.to_thread(warm_up)
+    yield
+
+app = FastAPI(lifespan=lifespan)
+
+# Every pipeline run reads and writes the same working files (question1.txt, scraped_data.*,
+# output_code.py), so runs take turns; the blocking steps run in worker
+# threads so the event loop keeps serving other requests meanwhile.
+PIPELINE_LOCK = asyncio.Lock()
+# Futures of the runs in progress, keyed by the sha256 of the uploaded question: an identical
+# upload that arrives meanwhile waits for that run's result instead of queueing a second run.
+_inflight = {}
+# Successful results by the same key, served without re-running the pipeline for ANSWER_TTL
+# seconds after they were computed. Answers come from live web pages, so the window only covers
+# repeated submissions of one question (client retries, double uploads), not long-term reuse.
+# At most MAX_CACHED_ANSWERS are kept (each may hold a base64 chart); the oldest go first.
+ANSWER_TTL = 10 * 60  # seconds
+MAX_CACHED_ANSWERS = 64
+_answers = {}
 
 # CORS setup
 app.add_middleware(
@@ -28,57 +54,101 @@ app.add_middleware(
 async def root():
     return {"message": "tds hello!"}
 
+def _prune_answers():
+    now = time.time()
+    for old in [k for k, (ts, _) in _answers.items() if now - ts >= ANSWER_TTL]:
+        del _answers[old]
+
+def _remember_answer(key, result):
+    _prune_answers()
+    _answers.pop(key, None)
+    while len(_answers) >= MAX_CACHED_ANSWERS:
+        # dicts keep insertion order, so the first key is the oldest result
+        del _answers[next(iter(_answers))]
+    _answers[key] = (time.time(), result)
+
+async def _run_pipeline(file_bytes):
+    """/api pipeline: scrape, convert, generate and run the answer code, blocking steps in worker threads."""
+    # Step 1: Save uploaded file
+    with open(QUESTION_PATH, "wb") as f:
+        f.write(file_bytes)
+    print(f"[Step 1] Saved question file → {QUESTION_PATH}")
+
+    # Step 2: Run scraping (the question text is handed over in memory, not re-read from disk)
+    question_text = file_bytes.decode("utf-8")
+    print("[Step 2] Running DataScraping...")
+    await asyncio.to_thread(task_breakdown, file_path=QUESTION_PATH, question=question_text)
+
+    # Step 3: Convert CSV → JSON, loading the answer prompt templates meanwhile
+    print("[Step 3] Converting scraped CSV to JSON...")
+    await asyncio.gather(asyncio.to_thread(csv_to_json), asyncio.to_thread(answer.preload_prompts))
+    if not os.path.exists(SCRAPED_PATH):
+        raise HTTPException(status_code=500, detail="scraped_data.json not created")
+    print(f"[Step 3] Conversion completed → {SCRAPED_PATH}")
+
+    # Step 4: Generate code
+    print("[Step 4] Generating code...")
+    gen_result = await asyncio.to_thread(answer.generate_and_save_code, question_text)
+    if gen_result.get("status") != "success":
+        return gen_result
+    print("[Step 4] Code generation successful.")
+
+    # Step 5: Run code & produce answer
+    print("[Step 5] Running generated code...")
+    run_result = await asyncio.to_thread(answer.run_code_and_save_answer, question_text)
+    if run_result.get("status") != "success":
+        return run_result
+    print("[Step 5] Execution finished.")
+
+    # Step 6: Return final output (handed over in memory by the runner)
+    final_answer = run_result["answer"]
+
+    print("===== /api pipeline finished =====\n")
+
+    return {
+        "status": "success",
+        "question_file": QUESTION_PATH,
+        "scraped_json": SCRAPED_PATH,
+        "answer": final_answer
+    }
+
+async def _run_locked(file_bytes):
+    try:
+        async with PIPELINE_LOCK:
+            return await _run_pipeline(file_bytes)
+    except Exception as e:
+        print(f"[Fatal Error] {str(e)}")
+        return {"status": "error", "message": str(e)}
+
 @app.post("/api")
 async def full_pipeline(question_file: UploadFile = File(...)):
     try:
         print("\n===== /api pipeline started =====")
 
-        # Step 1: Save uploaded file
         file_bytes = await question_file.read()
-        with open(QUESTION_PATH, "wb") as f:
-            f.write(file_bytes)
-        print(f"[Step 1] Saved question file → {QUESTION_PATH}")
-
-        # Step 2: Run scraping
-        print("[Step 2] Running DataScraping...")
-        task_breakdown(file_path=QUESTION_PATH)
-
-        # Step 3: Convert CSV → JSON
-        print("[Step 3] Converting scraped CSV to JSON...")
-        csv_to_json()
-        if not os.path.exists(SCRAPED_PATH):
-            raise HTTPException(status_code=500, detail="scraped_data.json not created")
-        print(f"[Step 3] Conversion completed → {SCRAPED_PATH}")
-
-        # Step 4: Generate code
-        question_text = file_bytes.decode("utf-8")
-        print("[Step 4] Generating code...")
-        gen_result = answer.generate_and_save_code(question_text)
-        if gen_result.get("status") != "success":
-            return gen_result
-        print("[Step 4] Code generation successful.")
-
-        # Step 5: Run code & produce answer
-        print("[Step 5] Running generated code...")
-        run_result = answer.run_code_and_save_answer()
-        if run_result.get("status") != "success":
-            return run_result
-        print("[Step 5] Execution finished.")
-
-        # Step 6: Return final output
-        if not os.path.exists(FINAL_OUTPUT_PATH):
-            raise HTTPException(status_code=500, detail="final_output.json not found")
-        with open(FINAL_OUTPUT_PATH, "r", encoding="utf-8") as f:
-            final_answer = json.load(f)
-
-        print("===== /api pipeline finished =====\n")
-
-        return {
-            "status": "success",
-            "question_file": QUESTION_PATH,
-            "scraped_json": SCRAPED_PATH,
-            "answer": final_answer
-        }
+        key = hashlib.sha256(file_bytes).hexdigest()
+        _prune_answers()
+        if key in _answers:
+            print("[Step 0] Same question answered recently, returning the cached result")
+            return _answers[key][1]
+        if key in _inflight:
+            print("[Step 0] Identical question already running, waiting for its result")
+            return await asyncio.shield(_inflight[key])
+
+        future = asyncio.get_running_loop().create_future()
+        _inflight[key] = future
+        try:
+            result = await _run_locked(file_bytes)
+            if result.get("status") == "success":
+                _remember_answer(key, result)
+            future.set_result(result)
+            return result
+        finally:
+            del _inflight[key]
+            if not future.done():
+                # The leading request was cancelled (e.g. its client disconnected). Cancelling the
+                # future would raise CancelledError in every waiting request; answer them with an error
+                future.set_result({"status": "error", "message": "Pipeline run was cancelled"})
 
     except Exception as e:
         print(f"[Fatal Error] {str(e)}")